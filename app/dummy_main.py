@@ -1,13 +1,12 @@
+import asyncio
+import functools
 import logging
 import os
+import threading
 
 from fastapi import FastAPI, HTTPException
-from azure.monitor.opentelemetry.exporter import AzureMonitorLogExporter
 from langchain_core.messages import HumanMessage
 from langchain_openai import AzureChatOpenAI
-from opentelemetry.sdk._logs import LoggerProvider
-from opentelemetry.sdk._logs import LoggingHandler
-from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
 from pydantic import BaseModel
 
 from azure_sql_agent.config import load_database_config
@@ -23,10 +22,15 @@ if not logger.handlers:
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
-# Optional: Azure Monitor logging (safe init for testing).
+# Optional: Azure Monitor logging (safe init for testing). Imported lazily
+# so the exporter/OTel stack doesn't slow cold start when telemetry is off.
 conn_str = os.getenv("AZURE_MONITOR_CONNECTION_STRING")
 if conn_str:
     try:
+        from azure.monitor.opentelemetry.exporter import AzureMonitorLogExporter
+        from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+        from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+
         lp = LoggerProvider()
         exporter = AzureMonitorLogExporter(connection_string=conn_str)
         lp.add_log_record_processor(BatchLogRecordProcessor(exporter))
@@ -43,6 +47,7 @@ class QueryRequest(BaseModel):
     question: str
 
 
+@functools.lru_cache(maxsize=1)
 def _build_llm() -> AzureChatOpenAI:
     endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
     deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME") or os.getenv("AZURE_OPENAI_DEPLOYMENT")
@@ -68,38 +73,58 @@ def _build_llm() -> AzureChatOpenAI:
     )
 
 
+# Lazy-initialized DB resources so repeated /dbcheck calls reuse one engine.
+_db_lock = threading.Lock()
+_db_bundle = None
+
+
+def _get_db_bundle():
+    global _db_bundle
+    if _db_bundle is not None:
+        return _db_bundle
+    with _db_lock:
+        if _db_bundle is not None:
+            return _db_bundle
+        cfg = load_database_config()
+        db, engine = connect_with_default_credential(
+            server=cfg.server,
+            database=cfg.database,
+            driver=cfg.driver,
+            include_tables=cfg.allowed_tables,
+            sample_rows_in_table_info=cfg.schema_sample_rows,
+        )
+        _db_bundle = (cfg, db, engine)
+        return _db_bundle
+
+
 @app.get("/healthz")
-def healthz():
+async def healthz():
     return {"status": "ok", "app": "dummy"}
 
 
 @app.get("/ping")
-def ping():
+async def ping():
     return {"pong": True}
 
 
 @app.post("/ask")
-def ask(req: QueryRequest):
+async def ask(req: QueryRequest):
     try:
         llm = _build_llm()
-        msg = llm.invoke([HumanMessage(content=req.question)])
+        msg = await llm.ainvoke([HumanMessage(content=req.question)])
         return {"answer": getattr(msg, "content", str(msg))}
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
 @app.get("/dbcheck")
-def dbcheck():
+async def dbcheck():
     try:
-        cfg = load_database_config()
-        db, _engine = connect_with_default_credential(
-            server=cfg.server,
-            database=cfg.database,
-            driver=cfg.driver,
-            include_tables=cfg.allowed_tables,
-            sample_rows_in_table_info=cfg.schema_sample_rows,
-        )
-        db.run("SELECT 1")
+        # Connection build and the probe query are blocking pyodbc calls;
+        # run them on the threadpool so the loop keeps serving requests.
+        loop = asyncio.get_running_loop()
+        cfg, db, _engine = await loop.run_in_executor(None, _get_db_bundle)
+        await loop.run_in_executor(None, db.run, "SELECT 1")
         return {"status": "ok", "db": cfg.database}
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
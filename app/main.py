@@ -1,73 +1,155 @@
+import asyncio
+import atexit
 import json
 import logging
 import logging.handlers
-import threading
+import queue
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 import sys
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from langchain_core.messages import AIMessage, HumanMessage
-from azure.monitor.opentelemetry.exporter import AzureMonitorLogExporter
-from opentelemetry.sdk._logs import LoggerProvider
-from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
-from opentelemetry.sdk._logs import LoggingHandler
-from azure.data.tables import TableServiceClient
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 import os
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-from azure_sql_agent import create_agent_from_env
+from azure_sql_agent import get_or_build_agent
 
 
 app = FastAPI(title="Azure SQL LangGraph Agent")
 logger = logging.getLogger("azure_sql_agent_app")
 AGENT_RECURSION_LIMIT = int(os.getenv("AGENT_RECURSION_LIMIT", "12"))
 
-# Logging: console by default; optional file logs for local use.
+# Logging: console by default; optional file logs for local use. All sinks
+# hang off a QueueListener thread so the request path only pays a queue.put
+# instead of inline file seek/write or stdout flushes.
 if not logger.handlers:
     fmt = logging.Formatter("%(asctime)s\t%(levelname)s\t%(message)s")
+    sink_handlers = []
     if os.getenv("LOG_TO_FILE", "0") == "1":
         log_dir = BASE_DIR / "logs"
         log_dir.mkdir(exist_ok=True)
         file_handler = logging.handlers.RotatingFileHandler(
-            log_dir / "agent.log", maxBytes=1_000_000, backupCount=5
+            log_dir / "agent.log", maxBytes=16_000_000, backupCount=5
         )
         file_handler.setFormatter(fmt)
-        logger.addHandler(file_handler)
+        sink_handlers.append(file_handler)
     console = logging.StreamHandler(sys.stdout)
     console.setFormatter(fmt)
-    logger.addHandler(console)
+    sink_handlers.append(console)
+
+    # Optional: export logs to Azure Monitor / App Insights if connection
+    # string provided. Imported lazily: the exporter/OTel stack costs
+    # hundreds of ms of import time and RSS, wasted when telemetry is off.
+    conn_str = os.getenv("AZURE_MONITOR_CONNECTION_STRING")
+    if conn_str:
+        from azure.monitor.opentelemetry.exporter import AzureMonitorLogExporter
+        from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+        from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+
+        lp = LoggerProvider()
+        exporter = AzureMonitorLogExporter(connection_string=conn_str)
+        lp.add_log_record_processor(BatchLogRecordProcessor(exporter))
+        sink_handlers.append(LoggingHandler(logger_provider=lp, level=logging.INFO))
+
+    _log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+    _log_listener = logging.handlers.QueueListener(
+        _log_queue, *sink_handlers, respect_handler_level=True
+    )
+    _log_listener.start()
+    # The listener thread is a daemon; stop it at exit so queued records
+    # drain to the sinks instead of dying with the interpreter.
+    atexit.register(_log_listener.stop)
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
-# Optional: export logs to Azure Monitor / App Insights if connection string provided
-conn_str = os.getenv("AZURE_MONITOR_CONNECTION_STRING")
-if conn_str:
-    lp = LoggerProvider()
-    exporter = AzureMonitorLogExporter(connection_string=conn_str)
-    lp.add_log_record_processor(BatchLogRecordProcessor(exporter))
-    otel_handler = LoggingHandler(logger_provider=lp, level=logging.INFO)
-    logger.addHandler(otel_handler)
-    logger.info("Azure Monitor logging enabled")
-else:
-    logger.info("AZURE_MONITOR_CONNECTION_STRING not set; Azure Monitor logging disabled")
+    if conn_str:
+        logger.info("Azure Monitor logging enabled")
+    else:
+        logger.info("AZURE_MONITOR_CONNECTION_STRING not set; Azure Monitor logging disabled")
 
 # Lazy-initialized resources to avoid failing the host on startup.
-_agent_lock = threading.Lock()
+_agent_lock = asyncio.Lock()
 _agent_bundle = None
 
+# Table Storage writes are buffered and flushed in batches off the request
+# path (submit_transaction allows up to 100 ops per partition key).
+TABLE_BATCH_MAX = int(os.getenv("AZURE_TABLE_BATCH_MAX", "100"))
+TABLE_FLUSH_SECONDS = float(os.getenv("AZURE_TABLE_FLUSH_SECONDS", "2.0"))
+_table_queue: "asyncio.Queue | None" = None
+_table_task = None
 
-def _build_table_client():
+
+async def _flush_table_batches(table_client, batches: "dict[str, list[dict]]"):
+    for entities in batches.values():
+        for start in range(0, len(entities), TABLE_BATCH_MAX):
+            chunk = entities[start : start + TABLE_BATCH_MAX]
+            try:
+                await table_client.submit_transaction([("upsert", e) for e in chunk])
+            except Exception as exc:
+                logger.exception(
+                    "failed to flush %d entities to Azure Table: %s", len(chunk), exc
+                )
+
+
+async def _drain_table_queue(table_client):
+    pending: dict[str, list[dict]] = {}
+    buffered = 0
+    try:
+        while True:
+            try:
+                entity = await asyncio.wait_for(_table_queue.get(), timeout=TABLE_FLUSH_SECONDS)
+                pending.setdefault(entity["PartitionKey"], []).append(entity)
+                buffered += 1
+                if buffered < TABLE_BATCH_MAX:
+                    continue
+            except asyncio.TimeoutError:
+                pass
+            if not pending:
+                continue
+            batches, pending, buffered = pending, {}, 0
+            await _flush_table_batches(table_client, batches)
+    finally:
+        # On cancellation (shutdown) everything buffered here plus anything
+        # still queued must reach Table Storage before the process exits.
+        while True:
+            try:
+                entity = _table_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            pending.setdefault(entity["PartitionKey"], []).append(entity)
+        if pending:
+            await _flush_table_batches(table_client, pending)
+
+
+async def _build_table_client():
     storage_conn = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
     table_name = os.getenv("AZURE_TABLE_NAME", "AgentLogs")
     if not storage_conn:
         logger.info("AZURE_STORAGE_CONNECTION_STRING not set; Azure Table logging disabled")
         return None
     try:
+        from azure.data.tables.aio import TableServiceClient
+
         ts = TableServiceClient.from_connection_string(storage_conn)
-        ts.create_table_if_not_exists(table_name=table_name)
+        await ts.create_table_if_not_exists(table_name=table_name)
         logger.info("Azure Table logging enabled (table=%s)", table_name)
         return ts.get_table_client(table_name=table_name)
     except Exception as exc:
@@ -75,29 +157,126 @@ def _build_table_client():
         return None
 
 
-def _get_agent_bundle():
+async def _get_agent_bundle():
     global _agent_bundle
     if _agent_bundle is not None:
         return _agent_bundle
-    with _agent_lock:
+    async with _agent_lock:
         if _agent_bundle is not None:
             return _agent_bundle
-        agent, db, llm = create_agent_from_env()
-        table_client = _build_table_client()
+        # Agent construction does blocking DB/schema introspection; keep the
+        # event loop free by running the one-shot build on the threadpool.
+        loop = asyncio.get_running_loop()
+        agent, db, llm = await loop.run_in_executor(None, get_or_build_agent)
+        table_client = await _build_table_client()
+        if table_client is not None:
+            global _table_queue, _table_task
+            _table_queue = asyncio.Queue()
+            _table_task = asyncio.create_task(_drain_table_queue(table_client))
         _agent_bundle = (agent, db, llm, table_client)
         return _agent_bundle
 
 
+@app.on_event("shutdown")
+async def _flush_table_queue_on_shutdown():
+    # Stop the drain task — its finally block flushes whatever is buffered
+    # or still queued — then close the aio client.
+    if _table_task is not None:
+        _table_task.cancel()
+        try:
+            await _table_task
+        except asyncio.CancelledError:
+            pass
+    if _agent_bundle is not None and _agent_bundle[3] is not None:
+        await _agent_bundle[3].close()
+
+
+# Repeated questions skip the whole agent loop (multiple LLM calls + SQL)
+# and return the cached (answer, executed_query). Keyed on the
+# whitespace/case-normalized question; TTL keeps answers from going stale
+# as data changes. Set ANSWER_CACHE_TTL_SECONDS=0 to disable.
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300"))
+ANSWER_CACHE_MAX = int(os.getenv("ANSWER_CACHE_MAX", "256"))
+_answer_cache: "OrderedDict[str, tuple[float, object, str | None]]" = OrderedDict()
+
+
+def _cache_key(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+def _cache_get(question: str):
+    if ANSWER_CACHE_TTL_SECONDS <= 0:
+        return None
+    entry = _answer_cache.get(_cache_key(question))
+    if entry is None:
+        return None
+    expires_at, answer, executed_query = entry
+    if expires_at < time.monotonic():
+        _answer_cache.pop(_cache_key(question), None)
+        return None
+    return answer, executed_query
+
+
+def _cache_put(question: str, answer, executed_query: "str | None") -> None:
+    if ANSWER_CACHE_TTL_SECONDS <= 0:
+        return
+    key = _cache_key(question)
+    _answer_cache[key] = (time.monotonic() + ANSWER_CACHE_TTL_SECONDS, answer, executed_query)
+    _answer_cache.move_to_end(key)
+    while len(_answer_cache) > ANSWER_CACHE_MAX:
+        _answer_cache.popitem(last=False)
+
+
+# Timestamp strings for Table entities are cached per wall-clock second so
+# back-to-back requests share one datetime + isoformat pass. RowKey carries
+# the uniqueness; second precision is plenty for the log timestamp.
+_stamp_cache: "tuple[int, str, str]" = (0, "", "")
+
+
+def _utc_stamps() -> "tuple[str, str]":
+    global _stamp_cache
+    second = int(time.time())
+    if _stamp_cache[0] != second:
+        now = datetime.utcnow()
+        _stamp_cache = (second, now.date().isoformat(), now.isoformat())
+    return _stamp_cache[1], _stamp_cache[2]
+
+
 class QueryRequest(BaseModel):
     question: str
 
 
 @app.post("/ask")
-def ask(req: QueryRequest):
+async def ask(req: QueryRequest):
     session_id = str(uuid.uuid4())
     try:
-        agent, _db, _llm, table_client = _get_agent_bundle()
-        result = agent.invoke(
+        cached = _cache_get(req.question)
+        if cached is not None:
+            answer, executed_query = cached
+            logger.info(
+                "session=%s cache_hit question=%s executed_query=%s",
+                session_id,
+                req.question,
+                executed_query,
+            )
+            # Cache hits still belong in the Azure Table audit log; a hit
+            # implies a prior miss already built the bundle and queue.
+            if _table_queue is not None:
+                partition_key, timestamp_utc = _utc_stamps()
+                _table_queue.put_nowait(
+                    {
+                        "PartitionKey": partition_key,
+                        "RowKey": session_id,
+                        "Question": req.question,
+                        "Answer": answer if isinstance(answer, str) else _dumps(answer),
+                        "ExecutedQuery": executed_query or "",
+                        "TimestampUtc": timestamp_utc,
+                    }
+                )
+            return {"session_id": session_id, "answer": answer, "query": executed_query}
+
+        agent, _db, _llm, table_client = await _get_agent_bundle()
+        result = await agent.ainvoke(
             {"messages": [HumanMessage(content=req.question)]},
             config={"recursion_limit": AGENT_RECURSION_LIMIT},
         )
@@ -110,18 +289,27 @@ def ask(req: QueryRequest):
         )
         answer = getattr(ai_msg, "content", str(ai_msg))
 
-        # Attempt to pull the executed query if present in tool output
+        # Attempt to pull the executed query if present in tool output.
+        # Walk backwards and stop at the first match — the execute tool's
+        # result is typically the last ToolMessage in the trace.
         executed_query = None
-        for msg in messages:
-            if hasattr(msg, "tool_calls") and msg.tool_calls:
+        for msg in reversed(messages):
+            if not isinstance(msg, ToolMessage):
                 continue
-            if isinstance(getattr(msg, "content", None), dict):
-                executed_query = msg.content.get("query") or executed_query
-            elif isinstance(getattr(msg, "content", None), list):
-                for item in msg.content:
-                    if isinstance(item, dict) and "query" in item:
-                        executed_query = item["query"]
-                        break
+            content = msg.content
+            if isinstance(content, dict) and "query" in content:
+                executed_query = content["query"]
+                break
+            if isinstance(content, list):
+                found = next(
+                    (item["query"] for item in content if isinstance(item, dict) and "query" in item),
+                    None,
+                )
+                if found is not None:
+                    executed_query = found
+                    break
+
+        _cache_put(req.question, answer, executed_query)
 
         logger.info(
             "session=%s question=%s executed_query=%s answer=%s",
@@ -132,18 +320,16 @@ def ask(req: QueryRequest):
         )
 
         if table_client:
-            try:
-                entity = {
-                    "PartitionKey": datetime.utcnow().date().isoformat(),
-                    "RowKey": session_id,
-                    "Question": req.question,
-                    "Answer": answer if isinstance(answer, str) else json.dumps(answer),
-                    "ExecutedQuery": executed_query or "",
-                    "TimestampUtc": datetime.utcnow().isoformat(),
-                }
-                table_client.upsert_entity(entity)
-            except Exception as exc:
-                logger.exception("session=%s failed to write to Azure Table: %s", session_id, exc)
+            partition_key, timestamp_utc = _utc_stamps()
+            entity = {
+                "PartitionKey": partition_key,
+                "RowKey": session_id,
+                "Question": req.question,
+                "Answer": answer if isinstance(answer, str) else _dumps(answer),
+                "ExecutedQuery": executed_query or "",
+                "TimestampUtc": timestamp_utc,
+            }
+            _table_queue.put_nowait(entity)
 
         return {"session_id": session_id, "answer": answer, "query": executed_query}
     except Exception as exc:  # pragma: no cover
@@ -151,3 +337,68 @@ def ask(req: QueryRequest):
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.post("/ask/stream")
+async def ask_stream(req: QueryRequest):
+    """Stream answer tokens as server-sent events instead of waiting for the
+    full agent run, so the client sees output at first-token latency and can
+    cancel long queries."""
+    session_id = str(uuid.uuid4())
+    agent, _db, _llm, table_client = await _get_agent_bundle()
+
+    async def gen():
+        answer_parts = []
+        executed_query = None
+        try:
+            async for ev in agent.astream_events(
+                {"messages": [HumanMessage(content=req.question)]},
+                version="v2",
+                config={"recursion_limit": AGENT_RECURSION_LIMIT},
+            ):
+                if ev["event"] == "on_chat_model_stream":
+                    # Only forward the agent node's model output. The
+                    # llm.invoke calls inside generate_sql_query /
+                    # fix_sql_error inherit the streaming callbacks, and
+                    # their chunks are raw SQL, not answer text.
+                    if ev.get("metadata", {}).get("langgraph_node") != "agent":
+                        continue
+                    chunk = ev["data"]["chunk"].content
+                    if chunk:
+                        answer_parts.append(chunk)
+                        yield f"data: {_dumps({'token': chunk})}\n\n"
+                elif ev["event"] == "on_tool_end":
+                    output = ev["data"].get("output")
+                    content = getattr(output, "content", output)
+                    if isinstance(content, dict) and "query" in content:
+                        executed_query = content["query"]
+            yield (
+                "data: "
+                + _dumps({"done": True, "session_id": session_id, "query": executed_query})
+                + "\n\n"
+            )
+        finally:
+            # Log and enqueue the Table entity after streaming ends so the
+            # bookkeeping never delays token delivery.
+            answer = "".join(answer_parts)
+            logger.info(
+                "session=%s question=%s executed_query=%s answer=%s",
+                session_id,
+                req.question,
+                executed_query,
+                answer,
+            )
+            if table_client:
+                partition_key, timestamp_utc = _utc_stamps()
+                _table_queue.put_nowait(
+                    {
+                        "PartitionKey": partition_key,
+                        "RowKey": session_id,
+                        "Question": req.question,
+                        "Answer": answer,
+                        "ExecutedQuery": executed_query or "",
+                        "TimestampUtc": timestamp_utc,
+                    }
+                )
+
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+
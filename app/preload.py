@@ -0,0 +1,31 @@
+"""Compute the schema snapshot once before uvicorn forks workers.
+
+Run as part of the container/start command:
+
+    python -m app.preload && uvicorn app.main:app --workers 4
+
+Each worker then loads the snapshot from tmpfs instead of running its own
+schema introspection round-trip against Azure SQL on cold start. Snapshots
+are rebuilt on every boot, so a redeploy/restart picks up schema changes.
+"""
+
+import logging
+
+from azure_sql_agent.config import load_database_config
+from azure_sql_agent.connections import build_sql_database
+from azure_sql_agent.schema_cache import db_identity, save_snapshot
+
+logger = logging.getLogger("azure_sql_agent_app")
+
+
+def main() -> None:
+    db = build_sql_database(load_database_config())
+    path = save_snapshot(
+        db.get_table_info(), list(db.get_usable_table_names()), db_identity(db)
+    )
+    logger.info("schema snapshot written to %s", path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,5 +1,5 @@
 """LangGraph SQL agent wired for Azure SQL DB or Fabric T-SQL endpoints."""
 
-from azure_sql_agent.agent import build_sql_agent, create_agent_from_env  # noqa: F401
+from azure_sql_agent.agent import build_sql_agent, create_agent_from_env, get_or_build_agent  # noqa: F401
 from azure_sql_agent.config import DatabaseConfig, OpenAIConfig, load_database_config, load_openai_config  # noqa: F401
 from azure_sql_agent.connections import build_azure_chat_llm, build_sql_database  # noqa: F401
@@ -1,8 +1,9 @@
 import operator
+import threading
 from typing import Annotated
 
 from langchain_core.language_models import BaseLanguageModel
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, ToolMessage
 from langchain_community.utilities import SQLDatabase
 from langgraph.graph import END, START, StateGraph
 from langgraph.prebuilt import ToolNode
@@ -17,8 +18,67 @@ class AgentState(TypedDict):
     messages: Annotated[list, operator.add]
 
 
+# Bounds on what gets re-sent to the LLM each hop; without them the prompt
+# grows quadratically over the loop as full schema dumps and row previews
+# accumulate in state.
+HISTORY_KEEP_MESSAGES = 8
+MAX_TOOL_RESULT_CHARS = 2000
+
+
+def _shrink_tool_message(msg: ToolMessage) -> ToolMessage:
+    content = msg.content
+    if not isinstance(content, str) or len(content) <= MAX_TOOL_RESULT_CHARS:
+        return msg
+    dropped = len(content) - MAX_TOOL_RESULT_CHARS
+    return ToolMessage(
+        content=f"{content[:MAX_TOOL_RESULT_CHARS]}\n...[truncated {dropped} chars]",
+        tool_call_id=msg.tool_call_id,
+        name=msg.name,
+    )
+
+
+def _compact_history(messages: list) -> list:
+    """Trim the view sent to the LLM: original question + recent turns,
+    with oversized tool outputs truncated. State itself stays append-only."""
+    if len(messages) <= HISTORY_KEEP_MESSAGES:
+        recent = messages
+    else:
+        start = len(messages) - HISTORY_KEEP_MESSAGES
+        # A ToolMessage must directly follow the AIMessage that issued its
+        # tool_calls; widen the window instead of orphaning results.
+        while start > 0 and isinstance(messages[start], ToolMessage):
+            start -= 1
+        recent = messages[start:]
+        if messages[0] is not recent[0]:
+            recent = [messages[0], *recent]
+    return [_shrink_tool_message(m) if isinstance(m, ToolMessage) else m for m in recent]
+
+
+# Immutable, so build the message object once instead of per graph step.
+_SYSTEM_MSG = SystemMessage(
+    content=(
+        "You are an expert Data analyst SQL assistant for Azure SQL Database or Fabric T-SQL endpoints. "
+        "You must answer by using the provided tools in this order when needed: "
+        "get_database_schema -> generate_sql_query -> execute_sql_query. "
+        "execute_sql_query validates that the query is read-only before running it. "
+        "Never return raw SQL as the final answer; always execute the query and return results. "
+        "Return a concise narrative summary AND, when rows are present, a clear table. "
+        "Only use read-only SQL (SELECT/CTE). Always inspect schema before generating SQL."
+    )
+)
+
+
+# Compiled agents memoized by (db, llm) identity: create_sql_tools re-runs
+# schema introspection and bind_tools rebuilds the tool schema payload, so
+# repeat builds against the same pair should be free.
+_agent_cache: list = []  # (db, llm, compiled agent) triples, identity-matched
+
+
 def build_sql_agent(db: SQLDatabase, llm: BaseLanguageModel):
     """Construct a LangGraph SQL agent wired with the given DB and LLM."""
+    for cached_db, cached_llm, cached_agent in _agent_cache:
+        if cached_db is db and cached_llm is llm:
+            return cached_agent
     tools = create_sql_tools(db, llm)
     # Use tool_choice if supported; otherwise fallback
     try:
@@ -31,21 +91,16 @@ def build_sql_agent(db: SQLDatabase, llm: BaseLanguageModel):
             return HumanMessage(content=msg)
         return msg
 
-    def agent_node(state: AgentState):
-        system_prompt = (
-            "You are an expert Data analyst SQL assistant for Azure SQL Database or Fabric T-SQL endpoints. "
-            "You must answer by using the provided tools in this order when needed: "
-            "get_database_schema -> generate_sql_query -> validate_sql_query -> execute_sql_query. "
-            "Never return raw SQL as the final answer; always execute the query and return results. "
-            "Return a concise narrative summary AND, when rows are present, a clear table. "
-            "Only use read-only SQL (SELECT/CTE). Always inspect schema before generating SQL."
-        )
-        user_messages = [_ensure_message(m) for m in state["messages"]]
-        return {
-            "messages": [
-                llm_with_tools.invoke([SystemMessage(content=system_prompt)] + user_messages)
-            ]
-        }
+    async def agent_node(state: AgentState):
+        msgs = state["messages"]
+        # After the first hop everything in state is already a BaseMessage;
+        # only wrap when raw strings were passed in.
+        if all(isinstance(m, BaseMessage) for m in msgs):
+            user_messages = msgs
+        else:
+            user_messages = [_ensure_message(m) for m in msgs]
+        user_messages = _compact_history(user_messages)
+        return {"messages": [await llm_with_tools.ainvoke([_SYSTEM_MSG, *user_messages])]}
 
     def should_continue(state: AgentState):
         last_message = state["messages"][-1]
@@ -65,7 +120,9 @@ def build_sql_agent(db: SQLDatabase, llm: BaseLanguageModel):
     )
     builder.add_edge("tools", "agent")
 
-    return builder.compile()
+    agent = builder.compile()
+    _agent_cache.append((db, llm, agent))
+    return agent
 
 
 def create_agent_from_env():
@@ -76,3 +133,20 @@ def create_agent_from_env():
     llm = build_azure_chat_llm(openai_cfg)
     db = build_sql_database(sql_cfg)
     return build_sql_agent(db, llm), db, llm
+
+
+# Process-wide lazy singleton for the env-configured bundle, so every app
+# variant shares one agent build instead of re-running it.
+_env_lock = threading.Lock()
+_env_bundle = None
+
+
+def get_or_build_agent():
+    """Return the (agent, db, llm) bundle, building it once per process."""
+    global _env_bundle
+    if _env_bundle is not None:
+        return _env_bundle
+    with _env_lock:
+        if _env_bundle is None:
+            _env_bundle = create_agent_from_env()
+        return _env_bundle
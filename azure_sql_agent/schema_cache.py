@@ -0,0 +1,107 @@
+"""Schema snapshot persistence shared across uvicorn workers.
+
+With multiple workers each process re-runs schema introspection (one Azure
+SQL round-trip per worker) on cold start. A pre-fork step can compute the
+snapshot once and persist it here (default: tmpfs under /dev/shm); workers
+then load it read-only instead of hitting the database.
+
+Snapshots are keyed on (server, database, allowed tables) and stamped with
+a creation time: the file outlives app restarts, so a loader pointed at a
+different database — or one older than SCHEMA_SNAPSHOT_MAX_AGE — must not
+silently serve the wrong schema.
+"""
+
+import logging
+import os
+import pickle
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH_ENV = "SCHEMA_SNAPSHOT_PATH"
+DEFAULT_SNAPSHOT_PATH = "/dev/shm/agent_schema.pkl"
+
+SNAPSHOT_MAX_AGE_ENV = "SCHEMA_SNAPSHOT_MAX_AGE"
+DEFAULT_SNAPSHOT_MAX_AGE = 86400.0  # seconds
+
+_SERVER_RE = re.compile(r"Server=(?:tcp:)?([^,;]+)", re.IGNORECASE)
+_DATABASE_RE = re.compile(r"Database=([^;]+)", re.IGNORECASE)
+
+
+def snapshot_path() -> str:
+    return os.getenv(SNAPSHOT_PATH_ENV, DEFAULT_SNAPSHOT_PATH)
+
+
+def db_identity(db) -> dict:
+    """Identify which database a SQLDatabase wrapper points at.
+
+    Parsed from the engine's odbc_connect string (the shape
+    connect_with_default_credential builds), plus the include-tables
+    whitelist; used to key snapshots so stale files for another database
+    are rejected.
+    """
+    odbc = str(db._engine.url.query.get("odbc_connect", ""))
+    server = _SERVER_RE.search(odbc)
+    database = _DATABASE_RE.search(odbc)
+    include_tables = getattr(db, "_include_tables", None)
+    return {
+        "server": server.group(1) if server else "",
+        "database": database.group(1) if database else "",
+        "allowed_tables": sorted(include_tables) if include_tables else [],
+    }
+
+
+def save_snapshot(table_info: str, table_names: list, identity: dict, path: str | None = None) -> str:
+    """Persist the schema snapshot atomically and return the path written."""
+    path = path or snapshot_path()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fh:
+        pickle.dump(
+            {
+                "table_info": table_info,
+                "table_names": list(table_names),
+                "identity": identity,
+                "created_at": time.time(),
+            },
+            fh,
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_snapshot(identity: dict, path: str | None = None) -> dict | None:
+    """Load a saved snapshot matching `identity`, or None.
+
+    Rejects files that are absent, unreadable, built for another
+    (server, database, allowed_tables) combination, or older than
+    SCHEMA_SNAPSHOT_MAX_AGE seconds.
+    """
+    path = path or snapshot_path()
+    try:
+        with open(path, "rb") as fh:
+            snapshot = pickle.load(fh)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        logger.warning("ignoring unreadable schema snapshot at %s: %s", path, exc)
+        return None
+    if not (
+        isinstance(snapshot, dict) and "table_info" in snapshot and "table_names" in snapshot
+    ):
+        logger.warning("ignoring malformed schema snapshot at %s", path)
+        return None
+    if snapshot.get("identity") != identity:
+        logger.warning(
+            "ignoring schema snapshot at %s built for %s (current: %s)",
+            path,
+            snapshot.get("identity"),
+            identity,
+        )
+        return None
+    max_age = float(os.getenv(SNAPSHOT_MAX_AGE_ENV, str(DEFAULT_SNAPSHOT_MAX_AGE)))
+    age = time.time() - snapshot.get("created_at", 0.0)
+    if age > max_age:
+        logger.warning("ignoring schema snapshot at %s aged %.0fs (max %.0fs)", path, age, max_age)
+        return None
+    return snapshot
@@ -1,14 +1,55 @@
+import logging
 import struct
+import threading
+import time
 import urllib.parse
 from typing import Tuple
 
 from azure.identity import DefaultAzureCredential
 from langchain_community.utilities import SQLDatabase
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+
+logger = logging.getLogger(__name__)
 
 # pyodbc access token connection attribute
 SQL_COPT_SS_ACCESS_TOKEN = 1256
 
+SQL_TOKEN_SCOPE = "https://database.windows.net/.default"
+
+# One credential per process: each DefaultAzureCredential instance walks the
+# full chain (env -> managed identity -> CLI -> ...) with I/O and subprocess
+# probes on first use, so constructing one per connection build is expensive.
+_CREDENTIAL = DefaultAzureCredential(
+    exclude_interactive_browser_credential=True,
+    exclude_visual_studio_code_credential=True,
+)
+
+# Cache the packed token until shortly before expiry so pooled connection
+# opens skip the credential round-trip entirely.
+_TOKEN_REFRESH_SLACK = 300  # seconds before expires_on to refresh
+_token_lock = threading.Lock()
+_token_cache: "tuple[float, bytes] | None" = None  # (expires_on, packed token)
+
+
+def _pack_token(token: str) -> bytes:
+    token_bytes = token.encode("UTF-16-LE")
+    return struct.pack(f"<I{len(token_bytes)}s", len(token_bytes), token_bytes)
+
+
+def _get_packed_token() -> bytes:
+    global _token_cache
+    cached = _token_cache
+    if cached is not None and cached[0] - _TOKEN_REFRESH_SLACK > time.time():
+        return cached[1]
+    with _token_lock:
+        cached = _token_cache
+        if cached is not None and cached[0] - _TOKEN_REFRESH_SLACK > time.time():
+            return cached[1]
+        token = _CREDENTIAL.get_token(SQL_TOKEN_SCOPE)
+        packed = _pack_token(token.token)
+        _token_cache = (token.expires_on, packed)
+        return packed
+
 
 def connect_with_default_credential(
     server: str,
@@ -23,14 +64,7 @@ def connect_with_default_credential(
     include_tables: optional whitelist of tables to expose to the agent.
     sample_rows_in_table_info: number of sample rows per table when introspecting schema.
     """
-    print(f"[connect_with_default_credential] server={server}, database={database}, driver={driver}")
-    print("[connect_with_default_credential] acquiring token via DefaultAzureCredential...")
-    credential = DefaultAzureCredential()
-    token = credential.get_token("https://database.windows.net/.default")
-    print("[connect_with_default_credential] token acquired.")
-
-    token_bytes = token.token.encode("UTF-16-LE")
-    token_struct = struct.pack(f"<I{len(token_bytes)}s", len(token_bytes), token_bytes)
+    logger.debug("[connect] server=%s database=%s driver=%s", server, database, driver)
 
     params = urllib.parse.quote_plus(
         f"Driver={{{driver}}};"
@@ -42,17 +76,32 @@ def connect_with_default_credential(
     )
 
     conn_str = f"mssql+pyodbc:///?odbc_connect={params}"
-    print(f"[connect_with_default_credential] connection string (pyodbc-encoded) ready.")
+    logger.debug("[connect] connection string (pyodbc-encoded) ready")
 
+    # Pool connections so bursts reuse warm TCP/TLS sessions instead of
+    # paying a full handshake + AAD auth per checkout. pool_recycle stays
+    # below Azure SQL's idle timeout; pool_pre_ping drops dead sockets.
     engine = create_engine(
         conn_str,
-        connect_args={"attrs_before": {SQL_COPT_SS_ACCESS_TOKEN: token_struct}},
+        pool_size=20,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_pre_ping=True,
+        pool_recycle=1500,
     )
-    print("[connect_with_default_credential] engine created, wrapping with SQLDatabase...")
+
+    @event.listens_for(engine, "do_connect")
+    def _inject_token(dialect, conn_rec, cargs, cparams):
+        # Inject per new connection rather than baking one token into the
+        # engine: pooled connections opened later would otherwise reuse a
+        # stale token. The packed token itself is cached until near expiry.
+        cparams.setdefault("attrs_before", {})[SQL_COPT_SS_ACCESS_TOKEN] = _get_packed_token()
+
+    logger.debug("[connect] engine created, wrapping with SQLDatabase")
     db = SQLDatabase(
         engine,
         include_tables=include_tables,
         sample_rows_in_table_info=sample_rows_in_table_info,
     )
-    print("[connect_with_default_credential] SQLDatabase ready.")
+    logger.debug("[connect] SQLDatabase ready")
     return db, engine
@@ -1,5 +1,7 @@
+import functools
 import logging
 import re
+import time
 from typing import List
 
 from langchain_core.language_models import BaseLanguageModel
@@ -7,14 +9,41 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.tools import tool
 from langchain_community.utilities import SQLDatabase
 
+from azure_sql_agent.schema_cache import db_identity, load_snapshot
+
 logger = logging.getLogger("azure_sql_agent_app")
 
+# Compiled once at import: validation runs twice per execute_sql_query call.
+_FENCE_RE = re.compile(r"```sql\s*|```\s*", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z_]+")
+_FORBIDDEN = frozenset(
+    {
+        "insert",
+        "update",
+        "delete",
+        "drop",
+        "alter",
+        "truncate",
+        "create",
+        "grant",
+        "revoke",
+        "exec",
+        "execute",
+        "merge",
+    }
+)
+
+# How long cached per-table schema strings stay valid before the next tool
+# call re-runs INFORMATION_SCHEMA introspection.
+SCHEMA_TTL_SECONDS = 300
+
+# Cap rows returned to the agent so one broad SELECT can't blow the token
+# budget of every subsequent LLM hop.
+MAX_RESULT_ROWS = 200
+
 
 def _strip_sql_fences(query: str) -> str:
-    clean = query.strip()
-    clean = re.sub(r"```sql\s*", "", clean, flags=re.IGNORECASE)
-    clean = re.sub(r"```\s*", "", clean, flags=re.IGNORECASE)
-    return clean.strip()
+    return _FENCE_RE.sub("", query.strip()).strip()
 
 
 def _validate_select_only(query: str) -> str:
@@ -24,22 +53,9 @@ def _validate_select_only(query: str) -> str:
     if not lowered.startswith(("select", "with")):
         return "Error: Only SELECT or CTE queries are allowed."
 
-    forbidden = [
-        "insert ",
-        "update ",
-        "delete ",
-        "drop ",
-        "alter ",
-        "truncate ",
-        "create ",
-        "grant ",
-        "revoke ",
-        "exec ",
-        "execute ",
-        "merge ",
-    ]
-
-    if any(term in lowered for term in forbidden):
+    # One tokenize pass plus a C-level set intersection, instead of running
+    # an alternation regex over the whole query.
+    if _FORBIDDEN & set(_WORD_RE.findall(lowered)):
         return "Error: Query contained a non-read keyword."
 
     return clean_query
@@ -47,17 +63,37 @@ def _validate_select_only(query: str) -> str:
 
 def create_sql_tools(db: SQLDatabase, llm: BaseLanguageModel) -> List:
     """Create tool functions bound to the provided database and model."""
-    schema_snapshot = db.get_table_info()
-    table_names = {t.lower(): t for t in db.get_usable_table_names()}
+    # Prefer the pre-fork snapshot (see app/preload.py) so each worker skips
+    # its own introspection round-trip on cold start. load_snapshot rejects
+    # files built for another database or past their max age.
+    snapshot = load_snapshot(db_identity(db))
+    if snapshot is not None:
+        schema_snapshot = snapshot["table_info"]
+        usable_tables = snapshot["table_names"]
+    else:
+        schema_snapshot = db.get_table_info()
+        usable_tables = db.get_usable_table_names()
+    table_names = {t.lower(): t for t in usable_tables}
+    # Precomputed (lowercased, original) pairs so fuzzy lookup doesn't
+    # rebuild and re-lower the candidate list on every call.
+    lowered_candidates = [(t.lower(), t) for t in table_names.values()]
+
+    @functools.lru_cache(maxsize=64)
+    def _table_info_cached(table: str, ttl_bucket: int) -> str:
+        # ttl_bucket rolls over every SCHEMA_TTL_SECONDS, expiring the entry
+        # without any extra bookkeeping.
+        return db.get_table_info([table])
+
+    def _get_table_info(table: str) -> str:
+        return _table_info_cached(table, int(time.monotonic() // SCHEMA_TTL_SECONDS))
 
     def _closest_table(name: str) -> str | None:
         lowered = name.lower()
         if lowered in table_names:
             return table_names[lowered]
         # simple fuzzy match on prefix/substring
-        candidates = list(table_names.values())
-        for candidate in candidates:
-            if lowered in candidate.lower() or candidate.lower() in lowered:
+        for candidate_lower, candidate in lowered_candidates:
+            if lowered in candidate_lower or candidate_lower in lowered:
                 return candidate
         return None
 
@@ -67,12 +103,12 @@ def create_sql_tools(db: SQLDatabase, llm: BaseLanguageModel) -> List:
         if table_name:
             try:
                 if table_name.lower() in table_names:
-                    return db.get_table_info([table_names[table_name.lower()]])
+                    return _get_table_info(table_names[table_name.lower()])
                 close = _closest_table(table_name)
                 if close:
                     return (
                         f"Requested table '{table_name}' not found; using closest match '{close}'.\n"
-                        f"{db.get_table_info([close])}"
+                        f"{_get_table_info(close)}"
                     )
                 return (
                     f"Requested table '{table_name}' not found. "
@@ -85,19 +121,24 @@ def create_sql_tools(db: SQLDatabase, llm: BaseLanguageModel) -> List:
                 )
         return schema_snapshot
 
+    def _generate_prompt_prefix(schema_text: str) -> str:
+        # Schema first so the long, stable part of the prompt is a
+        # byte-identical prefix across calls — that is what the provider's
+        # automatic prompt cache keys on.
+        return (
+            f"Schema:\n{schema_text}\n\n"
+            "You translate natural language into safe T-SQL.\n"
+            "Use only the provided schema. Do not invent tables or columns.\n"
+            "Only produce a single SQL query wrapped in ```sql``` fences.\n\n"
+        )
+
+    snapshot_prompt_prefix = _generate_prompt_prefix(schema_snapshot)
+
     @tool
     def generate_sql_query(question: str, schema_info: str | None = None) -> str:
         """Generate a SELECT query for the given natural language question."""
-        schema_text = schema_info if schema_info else schema_snapshot
-        prompt = f"""You translate natural language into safe T-SQL.
-Use only the provided schema. Do not invent tables or columns.
-Only produce a single SQL query wrapped in ```sql``` fences.
-
-Schema:
-{schema_text}
-
-Question: {question}
-SQL:"""
+        prefix = _generate_prompt_prefix(schema_info) if schema_info else snapshot_prompt_prefix
+        prompt = f"{prefix}Question: {question}\nSQL:"
         response = llm.invoke(
             [
                 SystemMessage(
@@ -108,11 +149,6 @@ SQL:"""
         )
         return response.content.strip()
 
-    @tool
-    def validate_sql_query(query: str) -> str:
-        """Validate that the SQL query is read-only and safe."""
-        return _validate_select_only(query)
-
     @tool
     def execute_sql_query(sql_query: str):
         """Validate and run the SQL query against the configured database."""
@@ -122,15 +158,17 @@ SQL:"""
 
         try:
             logger.info("executing_query=%s", validation)
-            result = db.run(validation)
-            # Normalize result for better downstream formatting
-            if isinstance(result, list):
-                return {
-                    "rows": result,
-                    "row_count": len(result),
-                    "query": validation,
-                }
-            return result
+            # Fetch structured rows straight off the cursor instead of
+            # db.run's stringified result, which the agent would only have
+            # to re-parse.
+            with db._engine.connect() as conn:
+                result = conn.exec_driver_sql(validation)
+                rows = [dict(row) for row in result.mappings().fetchmany(MAX_RESULT_ROWS)]
+            return {
+                "rows": rows,
+                "row_count": len(rows),
+                "query": validation,
+            }
         except Exception as exc:  # pragma: no cover - execution errors surfaced to fixer
             return f"Execution error: {exc}"
 
@@ -162,7 +200,6 @@ Corrected SQL:"""
     return [
         get_database_schema,
         generate_sql_query,
-        validate_sql_query,
         execute_sql_query,
         fix_sql_error,
     ]